@@ -8,7 +8,7 @@ _METACLASS_ = '_metaclass_helper_'
 
 
 def with_metaclass(meta, base=object):
-    return meta(_METACLASS_, (base,), {})
+    return meta(_METACLASS_, (base,), {'__slots__': ()})
 
 
 PY2 = sys.version_info[0] == 2
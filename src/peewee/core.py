@@ -1049,12 +1049,17 @@ class RelationDescriptor(FieldDescriptor):
         super(RelationDescriptor, self).__init__(field)
 
     def get_object_or_id(self, instance):
+        # Check the object cache first: rows loaded through a join already
+        # carry the related instance, so no lookup into _data is needed.
+        obj_cache = instance._obj_cache
+        if self.att_name in obj_cache:
+            return obj_cache[self.att_name]
+
         rel_id = instance._data.get(self.att_name)
-        if rel_id is not None or self.att_name in instance._obj_cache:
-            if self.att_name not in instance._obj_cache:
-                obj = self.rel_model.get(self.field.to_field == rel_id)
-                instance._obj_cache[self.att_name] = obj
-            return instance._obj_cache[self.att_name]
+        if rel_id is not None:
+            obj = self.rel_model.get(self.field.to_field == rel_id)
+            obj_cache[self.att_name] = obj
+            return obj
         elif not self.field.null:
             raise self.rel_model.DoesNotExist
         return rel_id
@@ -1547,11 +1552,6 @@ class QueryCompiler(object):
             if node._ordering:
                 sql = ' '.join((sql, node._ordering))
 
-        if params and any(isinstance(p, Node) for p in params):
-            for idx, param in enumerate(params):
-                if isinstance(param, Node):
-                    csql, cparams = self.parse_node(param)
-
         return sql, params
 
     def parse_node_list(self, nodes, alias_map, conv=None, glue=', '):
@@ -1699,6 +1699,7 @@ class QueryCompiler(object):
         model = query.model_class
         alias_map = self.alias_map_class()
         alias_map.add(model, model._meta.db_table)
+        node_types = (Node, Model)
         if query._on_conflict:
             statement = 'UPDATE OR {0!s}'.format(query._on_conflict)
         else:
@@ -1707,7 +1708,7 @@ class QueryCompiler(object):
 
         update = []
         for field, value in self._sorted_fields(query._update):
-            if not isinstance(value, (Node, Model)):
+            if not isinstance(value, node_types):
                 value = Param(value, adapt=field.db_value)
             update.append(Expression(
                 field.as_entity(with_table=False),
@@ -1732,7 +1733,7 @@ class QueryCompiler(object):
         model = query.model_class
         meta = model._meta
         alias_map = self.alias_map_class()
-        alias_map.add(model, model._meta.db_table)
+        alias_map.add(model, meta.db_table)
         if query._upsert:
             statement = meta.database.upsert_sql
         elif query._on_conflict:
@@ -1750,6 +1751,8 @@ class QueryCompiler(object):
         elif query._rows is not None:
             fields, value_clauses = [], []
             have_fields = False
+            node_types = (Node, Model)
+            append_clause = value_clauses.append
 
             for row_dict in query._iter_rows():
                 if not have_fields:
@@ -1760,25 +1763,25 @@ class QueryCompiler(object):
                 values = []
                 for field in fields:
                     value = row_dict[field]
-                    if not isinstance(value, (Node, Model)):
+                    if not isinstance(value, node_types):
                         value = Param(value, adapt=field.db_value)
                     values.append(value)
 
-                value_clauses.append(EnclosedClause(*values))
+                append_clause(EnclosedClause(*values))
 
             if fields:
                 clauses.extend([self._get_field_clause(fields),
                                 SQL('VALUES'), CommaClause(*value_clauses)])
-            elif query.model_class._meta.auto_increment:
+            elif meta.auto_increment:
                 # Bare insert, use default value for primary key.
-                clauses.append(query.database.default_insert_clause(
-                    query.model_class))
+                clauses.append(query.database.default_insert_clause(model))
 
         if query.is_insert_returning:
-            clauses.extend([SQL('RETURNING'),
-                            self._get_field_clause(
-                                meta.get_primary_key_fields(),
-                                clause_type=CommaClause)])
+            # The primary key columns are fixed per model, so render them
+            # directly rather than building and parsing an entity per column.
+            clauses.append(SQL('RETURNING {0!s}'.format(', '.join([
+                self.quote(field.db_column)
+                for field in meta.get_primary_key_fields()]))))
         elif query._returning is not None:
             returning_clause = Clause(*query._returning)
             returning_clause.glue = ', '
@@ -3545,6 +3548,9 @@ class SqliteDatabase(Database):
     op_overrides = {OP.LIKE: 'GLOB',
                     OP.ILIKE: 'LIKE', }
     upsert_sql = 'INSERT OR REPLACE INTO'
+    # Size of the driver's per-connection prepared statement cache. Queries
+    # are parameterized, so repeated lookups share one compiled statement.
+    cached_statements = 256
 
     def __init__(self, database, pragmas=None, *args, **kwargs):
         self._pragmas = pragmas or []
@@ -3555,6 +3561,7 @@ class SqliteDatabase(Database):
         super(SqliteDatabase, self).__init__(database, *args, **kwargs)
 
     def _connect(self, database, **kwargs):
+        kwargs.setdefault('cached_statements', self.cached_statements)
         conn = sqlite3.connect(database, **kwargs)
         conn.isolation_level = None
         try:
@@ -3633,6 +3640,9 @@ class SqliteDatabase(Database):
     def savepoint(self, sid=None):
         return savepoint_sqlite(self, sid)
 
+    def transaction(self, lock_type=None):
+        return transaction(self, lock_type)
+
     def extract_date(self, date_part, date_field):
         return fn.date_part(date_part, date_field)
 
@@ -3718,11 +3728,15 @@ class _atomic(_callable_context_manager):
 
 
 class transaction(_callable_context_manager):
-    def __init__(self, db):
+    def __init__(self, db, lock_type=None):
         self.db = db
+        self.lock_type = lock_type
 
     def _begin(self):
-        self.db.begin()
+        if self.lock_type:
+            self.db.begin(self.lock_type)
+        else:
+            self.db.begin()
 
     def commit(self, begin=True):
         self.db.commit()
@@ -3907,7 +3921,8 @@ class ModelOptions(object):
     def __init__(self, cls, database=None, db_table=None, db_table_func=None,
                  indexes=None, order_by=None, primary_key=None,
                  table_alias=None, constraints=None, schema=None,
-                 validate_backrefs=True, only_save_dirty=False, **kwargs):
+                 validate_backrefs=True, only_save_dirty=False,
+                 use_slots=False, **kwargs):
         self.model_class = cls
         self.name = cls.__name__.lower()
         self.fields = {}
@@ -3934,6 +3949,7 @@ class ModelOptions(object):
         self.schema = schema
         self.validate_backrefs = validate_backrefs
         self.only_save_dirty = only_save_dirty
+        self.use_slots = use_slots
 
         self.auto_increment = None
         self.composite_key = False
@@ -4070,7 +4086,7 @@ class ModelOptions(object):
 class BaseModel(type):
     inheritable = {'constraints', 'database', 'db_table_func', 'indexes',
                    'order_by', 'primary_key', 'schema', 'validate_backrefs',
-                   'only_save_dirty'}
+                   'only_save_dirty', 'use_slots'}
 
     def __new__(cls, name, bases, attrs):
         if name == _METACLASS_ or bases[0].__name__ == _METACLASS_:
@@ -4108,11 +4124,15 @@ class BaseModel(type):
                     if not v.field.primary_key:
                         attrs[k] = deepcopy(v.field)
 
+        # slotted models store their state only in the slots declared on
+        # Model, so instances carry no per-instance __dict__.
+        if meta_options.get('use_slots'):
+            attrs.setdefault('__slots__', ())
+
         # initialize the new class and set the magic attributes
         cls = super(BaseModel, cls).__new__(cls, name, bases, attrs)
         ModelOptionsBase = meta_options.get('model_options_base', ModelOptions)
         cls._meta = ModelOptionsBase(cls, **meta_options)
-        cls._data = None
         cls._meta.indexes = list(cls._meta.indexes)
 
         if not cls._meta.db_table:
@@ -4139,8 +4159,12 @@ class BaseModel(type):
             pk_name = '_composite_key'
             composite_key = True
 
+        # Name of the primary key attribute, resolved once so instance-level
+        # pk access (hashing, equality, save) skips the _meta lookups.
+        cls._pk_attname = None
         if model_pk is not False:
             model_pk.add_to_class(cls, pk_name)
+            cls._pk_attname = pk_name
             cls._meta.primary_key = model_pk
             cls._meta.auto_increment = (
                 isinstance(model_pk, PrimaryKeyField) or
@@ -4173,6 +4197,8 @@ class BaseModel(type):
 
 
 class Model(with_metaclass(BaseModel)):
+    __slots__ = ('_data', '_dirty', '_obj_cache')
+
     def __init__(self, *args, **kwargs):
         self._data = self._meta.get_default_dict()
         self._dirty = set(self._data)
@@ -4362,13 +4388,13 @@ class Model(with_metaclass(BaseModel)):
         return NoopSelectQuery(cls, *args, **kwargs)
 
     def _get_pk_value(self):
-        return getattr(self, self._meta.primary_key.name)
+        return getattr(self, self._pk_attname)
 
     get_id = _get_pk_value  # Backwards-compatibility.
 
     def _set_pk_value(self, value):
         if not self._meta.composite_key:
-            setattr(self, self._meta.primary_key.name, value)
+            setattr(self, self._pk_attname, value)
 
     set_id = _set_pk_value  # Backwards-compatibility.
 
@@ -4400,6 +4426,12 @@ class Model(with_metaclass(BaseModel)):
                 field_dict[key] = self._data[key]
 
     def save(self, force_insert=False, only=None):
+        # Nothing has changed since the instance was loaded or last saved, so
+        # there is nothing to write.
+        if (self._meta.only_save_dirty and not self._dirty and
+                not force_insert and not only):
+            return False
+
         field_dict = dict(self._data)
         if self._meta.primary_key is not False:
             pk_field = self._meta.primary_key
@@ -4476,16 +4508,31 @@ class Model(with_metaclass(BaseModel)):
         return self.delete().where(self._pk_expr()).execute()
 
     def __hash__(self):
-        return hash((self.__class__, self._get_pk_value()))
+        return hash((self.__class__, getattr(self, self._pk_attname)))
 
     def __eq__(self, other):
-        return (other.__class__ == self.__class__ and
-                self._get_pk_value() is not None and
-                other._get_pk_value() == self._get_pk_value())
+        if other.__class__ != self.__class__:
+            return False
+        pk_value = getattr(self, self._pk_attname)
+        return (pk_value is not None and
+                getattr(other, self._pk_attname) == pk_value)
 
     def __ne__(self, other):
         return not self == other
 
+    def __getstate__(self):
+        # Pickle the slot values alongside any instance attributes, which
+        # also keeps protocols 0 and 1 working with the slotted base class.
+        state = dict(getattr(self, '__dict__', ()))
+        for attr in Model.__slots__:
+            if hasattr(self, attr):
+                state[attr] = getattr(self, attr)
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
 
 def clean_prefetch_subquery(query):
     query = query.clone()
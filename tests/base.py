@@ -13,6 +13,9 @@ from peewee.core import AliasMap, QueryCompiler, SelectQuery, logger
 
 TEST_BACKEND = os.environ.get('PEEWEE_TEST_BACKEND') or 'sqlite'
 TEST_DATABASE = os.environ.get('PEEWEE_TEST_DATABASE') or 'peewee_test'
+if os.environ.get('PYTEST_XDIST_WORKER'):
+    # Give each pytest-xdist worker its own database file.
+    TEST_DATABASE += '_' + os.environ['PYTEST_XDIST_WORKER']
 TEST_VERBOSITY = int(os.environ.get('PEEWEE_TEST_VERBOSITY') or 1)
 
 if TEST_VERBOSITY > 1:
@@ -76,6 +79,14 @@ class DatabaseInitializer(object):
                         passphrase=passphrase, **kwargs)
 
     def get_sqlite_database(self, db_class, **kwargs):
+        # WAL with synchronous=NORMAL avoids an fsync on every commit, which
+        # otherwise dominates the run time of the transaction tests.
+        kwargs.setdefault('pragmas', [
+            ('journal_mode', 'wal'),
+            ('synchronous', 'NORMAL'),
+            ('temp_store', 'MEMORY'),
+            ('cache_size', -8000),
+            ('mmap_size', 268435456)])
         return db_class(self.get_filename('.db'), **kwargs)
 
     def get_in_memory_database(self, db_class=None, **kwargs):
@@ -125,6 +136,7 @@ database_initializer = DatabaseInitializer(TEST_BACKEND, TEST_DATABASE)
 
 database_class = database_initializer.get_database_class()
 test_db = database_initializer.get_database()
+IS_SQLITE = isinstance(test_db, SqliteDatabase)
 query_db = TestDatabase(':memory:')
 
 compiler = query_db.compiler()
@@ -216,16 +228,28 @@ class PeeweeTestCase(TestCase):
 class ModelTestCase(PeeweeTestCase):
     requires = None
 
+    # When set, setUp and the test body run inside a single transaction
+    # which is rolled back in tearDown, so the test never commits.
+    wrap_in_transaction = False
+
     def setUp(self):
         super(ModelTestCase, self).setUp()
         if self.requires:
-            test_db.drop_tables(self.requires, True)
-            test_db.create_tables(self.requires)
+            with test_db.atomic():
+                test_db.drop_tables(self.requires, True)
+                test_db.create_tables(self.requires)
+        if self.wrap_in_transaction:
+            self._txn = test_db.atomic()
+            self._txn.__enter__()
 
     def tearDown(self):
         super(ModelTestCase, self).tearDown()
+        if self.wrap_in_transaction:
+            test_db.rollback()
+            self._txn.__exit__(None, None, None)
         if self.requires:
-            test_db.drop_tables(self.requires, True)
+            with test_db.atomic():
+                test_db.drop_tables(self.requires, True)
 
 
 # TestCase class decorators that allow skipping entire test-cases.
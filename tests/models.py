@@ -99,8 +99,13 @@ class User(TestModel):
 
     @classmethod
     def create_users(cls, n):
-        for i in range(n):
-            cls.create(username='u{0:d}'.format((i + 1)))
+        cls.bulk_create_users('u{0:d}'.format(i + 1) for i in range(n))
+
+    @classmethod
+    def bulk_create_users(cls, usernames):
+        rows = [{'username': username} for username in usernames]
+        if rows:
+            cls.insert_many(rows).execute()
 
 
 class Blog(TestModel):
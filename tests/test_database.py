@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import sqlite3
 import threading
 
+import mock
 import pytest
 
 from peewee import CharField, IntegerField, Model, SqliteDatabase
-from tests.base import (ModelTestCase, PeeweeTestCase, TestModel, compiler,
-                        database_initializer, query_db, skip_unless, test_db)
+from tests.base import (IS_SQLITE, ModelTestCase, PeeweeTestCase, TestModel,
+                        compiler, database_initializer, query_db, skip_unless,
+                        test_db)
 from tests.models import (Blog, MultiIndexModel, SeqModelA,
                           SeqModelB, UniqueModel, User)
 
@@ -27,7 +30,7 @@ class TestMultiThreadedQueries(ModelTestCase):
             kwargs.update(test_db.connect_kwargs)
         except Exception:
             pass
-        if isinstance(test_db, SqliteDatabase):
+        if IS_SQLITE:
             # Put a very large timeout in place to avoid `database is locked`
             # when using SQLite (default is 5).
             kwargs['timeout'] = 30
@@ -240,7 +243,7 @@ class TestDatabaseSequences(ModelTestCase):
         assert b2.id == a3.id - 1
 
 
-@skip_unless(lambda: isinstance(test_db, SqliteDatabase))
+@skip_unless(lambda: IS_SQLITE)
 class TestOuterLoopInnerCommit(ModelTestCase):
     requires = [User, Blog]
 
@@ -314,3 +317,20 @@ class TestConnectionInitialization(PeeweeTestCase):
         db.close()
         db.connect()
         assert state['initialized'] == 2
+
+
+class TestSqliteStatementCache(PeeweeTestCase):
+    def test_cached_statements(self):
+        with mock.patch.object(sqlite3, 'connect',
+                               wraps=sqlite3.connect) as patched_connect:
+            db = SqliteDatabase(':memory:')
+            db.get_conn()
+            db.close()
+
+            db = SqliteDatabase(':memory:', cached_statements=16)
+            db.get_conn()
+            db.close()
+
+        (_, kwargs1), (_, kwargs2) = patched_connect.call_args_list
+        assert kwargs1['cached_statements'] == 256
+        assert kwargs2['cached_statements'] == 16
@@ -14,7 +14,7 @@ from peewee import (BlobField, DateField, DateTimeField, DecimalField,
                     SqliteDatabase, TimeField, fn, prefetch)
 from peewee.core import sqlite3
 from peewee._compat import binary_construct, binary_types
-from tests.base import (ModelTestCase, PeeweeTestCase, TestModel,
+from tests.base import (IS_SQLITE, ModelTestCase, PeeweeTestCase, TestModel,
                         skip_test_if, skip_unless, test_db)
 from tests.models import (BlobModel, Blog, CheckModel, DBBlog, DBUser,
                           JERRelated, Job, JobExecutionRecord, MultiIndexModel,
@@ -104,7 +104,7 @@ class TestFieldTypes(ModelTestCase):
         nm_alpha = NM.create(char_field='Alpha')
         nm_bravo = NM.create(char_field='Bravo')
 
-        if isinstance(test_db, SqliteDatabase):
+        if IS_SQLITE:
             # Sqlite's sql-dialect uses "*" as case-sensitive lookup wildcard,
             # and pysqlcipher is simply a wrapper around sqlite's engine.
             like_wildcard = '*'
@@ -884,7 +884,7 @@ class TestUUIDField(ModelTestCase):
             assert accum == [('a', [0, 1, 2]), ('b', [0, 1, 2])]
 
 
-@skip_unless(lambda: isinstance(test_db, SqliteDatabase))
+@skip_unless(lambda: IS_SQLITE)
 class TestForeignKeyConversion(ModelTestCase):
     requires = [UIntModel, UIntRelModel]
 
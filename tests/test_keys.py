@@ -3,10 +3,10 @@
 import pytest
 
 from peewee import (CharField, DecimalField, DeferredRelation, ForeignKeyField,
-                    IntegrityError, JOIN, Model, OperationalError,
-                    SqliteDatabase, TextField, fn)
-from tests.base import (ModelTestCase, PeeweeTestCase, TestModel, compiler,
-                        database_initializer, test_db)
+                    IntegrityError, JOIN, Model, OperationalError, TextField,
+                    fn)
+from tests.base import (IS_SQLITE, ModelTestCase, PeeweeTestCase, TestModel,
+                        compiler, database_initializer, test_db)
 from tests.models import (Blog, Component, CompositeKeyModel, Computer,
                           Language, Manufacturer, Package, PackageItem, Post,
                           Relationship, Snippet, Tag, TagPostThrough, User,
@@ -406,7 +406,7 @@ class TestForeignKeyConstraints(ModelTestCase):
         super(TestForeignKeyConstraints, self).tearDown()
 
     def set_foreign_key_pragma(self, is_enabled):
-        if not isinstance(test_db, SqliteDatabase):
+        if not IS_SQLITE:
             return
 
         state = 'on' if is_enabled else 'off'
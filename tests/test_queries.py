@@ -1318,6 +1318,14 @@ class TestInsertReturning(PeeweeTestCase):
             'INSERT INTO "user" ("username") VALUES (?), (?), (?)',
             ['user-0', 'user-1', 'user-2'])
 
+        # Requesting the id list batches all rows into one INSERT ... RETURNING
+        # instead of issuing a statement per row.
+        self.assertInsertSQL(
+            User.insert_many(data).return_id_list(),
+            ('INSERT INTO "user" ("username") VALUES (?), (?), (?) '
+             'RETURNING "id"'),
+            ['user-0', 'user-1', 'user-2'])
+
 
 class TestDeleteQuery(PeeweeTestCase):
     def setUp(self):
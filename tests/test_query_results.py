@@ -146,11 +146,15 @@ class TestQueryResultWrapper(ModelTestCase):
 
     def test_iterator_extended(self):
         User.create_users(10)
+        user_ids = dict(User
+                        .select(User.username, User.id)
+                        .where(User.username << ['u1', 'u2', 'u3'])
+                        .tuples())
         for i in range(1, 4):
             for j in range(i):
                 Blog.create(
                     title='blog-{0!s}-{1!s}'.format(i, j),
-                    user=User.get(User.username == 'u{0!s}'.format(i)))
+                    user=user_ids['u{0!s}'.format(i)])
 
         qr = (User.select(User.username,
                           fn.Count(Blog.pk).alias('ct'))
@@ -297,21 +301,21 @@ class TestQueryResultWrapper(ModelTestCase):
         b1 = Blog.create(user=u1, title='b1')
         b2 = Blog.create(user=u2, title='b2')
         users = User.select().tuples().order_by(User.id)
-        assert [r for r in users] == [(u1.id, 'u1'),
-                                      (u2.id, 'u2')]
+        assert list(users) == [(u1.id, 'u1'),
+                               (u2.id, 'u2')]
 
         users = User.select().dicts()
-        assert [r for r in users] == [
+        assert list(users) == [
             {'id': u1.id, 'username': 'u1'},
             {'id': u2.id, 'username': 'u2'}]
 
         users = User.select(User, Blog).join(Blog).order_by(User.id).tuples()
-        assert [r for r in users] == [
+        assert list(users) == [
             (u1.id, 'u1', b1.pk, u1.id, 'b1', '', None),
             (u2.id, 'u2', b2.pk, u2.id, 'b2', '', None)]
 
         users = User.select(User, Blog).join(Blog).order_by(User.id).dicts()
-        assert [r for r in users] == [
+        assert list(users) == [
             {'id': u1.id, 'username': 'u1', 'pk': b1.pk, 'user': u1.id,
              'title': 'b1', 'content': '', 'pub_date': None},
             {'id': u2.id, 'username': 'u2', 'pk': b2.pk, 'user': u2.id,
@@ -1195,7 +1199,7 @@ class TestPrefetchMultipleFKs(ModelTestCase):
             relationships = Relationship.select()
 
             query = prefetch(users, relationships)
-            results = [row for row in query]
+            results = list(query)
             assert len(results) == 3
 
             cp, hp, zp = results
@@ -1226,7 +1230,7 @@ class TestPrefetchMultipleFKs(ModelTestCase):
             users = User.select()
 
             query = prefetch(relationships, users)
-            results = [row for row in query]
+            results = list(query)
             assert len(results) == 4
 
             expected = (('charlie', 'huey'),
@@ -1618,7 +1622,7 @@ class TestAggregateRows(BaseTestPrefetch):
                      .where(User.username == 'charlie')
                      .aggregate_rows())
 
-            results = [row for row in query]
+            results = list(query)
             assert len(results) == 1
 
             user = results[0]
@@ -7,44 +7,72 @@ import pytest
 
 from peewee import IntegrityError, InternalError, SqliteDatabase
 from peewee.core import _atomic, transaction
-from tests.base import ModelTestCase, test_db
+from tests.base import ModelTestCase, database_initializer, test_db
 from tests.models import Blog, UniqueModel, User
 
+in_memory_db = database_initializer.get_in_memory_database()
+
+
+usernames_query = User.select(User.username).order_by(User.username).tuples()
+unique_names_query = (UniqueModel
+                      .select(UniqueModel.name)
+                      .order_by(UniqueModel.name)
+                      .tuples())
+
+
+def get_usernames():
+    # Clone the shared query rather than rebuilding it; a clone has no cached
+    # result rows, so each call re-runs the SELECT.
+    return [username for username, in usernames_query.clone()]
+
+
+def assert_user_count(expected):
+    cursor = test_db.execute_sql('SELECT COUNT(*) FROM users;',
+                                 require_commit=False)
+    assert cursor.fetchone()[0] == expected
+
 
 class TestTransaction(ModelTestCase):
     requires = [User, Blog]
 
+    def setUp(self):
+        super(TestTransaction, self).setUp()
+        # Second connection used to check what other clients can see.
+        self.observer_db = self.new_connection()
+
     def tearDown(self):
+        if not self.observer_db.is_closed():
+            self.observer_db.close()
         super(TestTransaction, self).tearDown()
         test_db.set_autocommit(True)
 
     def test_transaction_connection_handling(self):
-        patch = 'peewee.core.Database'
-        db = SqliteDatabase(':memory:')
-        with mock.patch(patch, wraps=db) as patched_db:
-            with transaction(patched_db):
-                patched_db.begin.assert_called_once_with()
-                assert patched_db.commit.call_count == 0
-                assert patched_db.rollback.call_count == 0
-
-            patched_db.begin.assert_called_once_with()
-            patched_db.commit.assert_called_once_with()
-            assert patched_db.rollback.call_count == 0
-
-        with mock.patch(patch, wraps=db) as patched_db:
-            def _test_patched():
-                patched_db.commit.side_effect = ValueError
-                with transaction(patched_db):
-                    pass
+        # A wrapping Mock is enough to record begin/commit/rollback calls.
+        spy_db = mock.Mock(wraps=in_memory_db)
+        with transaction(spy_db):
+            spy_db.begin.assert_called_once_with()
+            assert spy_db.commit.call_count == 0
+            assert spy_db.rollback.call_count == 0
+
+        spy_db.begin.assert_called_once_with()
+        spy_db.commit.assert_called_once_with()
+        assert spy_db.rollback.call_count == 0
+
+        spy_db = mock.Mock(wraps=in_memory_db)
+        spy_db.commit.side_effect = ValueError
+
+        def _test_patched():
+            with transaction(spy_db):
+                pass
 
-            with pytest.raises(ValueError):
-                _test_patched()
-            patched_db.begin.assert_called_once_with()
-            patched_db.commit.assert_called_once_with()
-            patched_db.rollback.assert_called_once_with()
+        with pytest.raises(ValueError):
+            _test_patched()
+        spy_db.begin.assert_called_once_with()
+        spy_db.commit.assert_called_once_with()
+        spy_db.rollback.assert_called_once_with()
 
     def test_atomic_nesting(self):
-        db = SqliteDatabase(':memory:')
+        db = in_memory_db
         db_patches = mock.patch.multiple(db, begin=mock.DEFAULT,
                                          commit=mock.DEFAULT,
                                          execute_sql=mock.DEFAULT,
@@ -89,15 +117,14 @@ class TestTransaction(ModelTestCase):
 
         # open up a new connection to the database, it won't register any blogs
         # as being created
-        new_db = self.new_connection()
-        res = new_db.execute_sql('select count(*) from users;')
+        res = self.observer_db.execute_sql('select count(*) from users;')
         assert res.fetchone()[0] == 0
 
         # commit our blog inserts
         test_db.commit()
 
         # now the blogs are query-able from another connection
-        res = new_db.execute_sql('select count(*) from users;')
+        res = self.observer_db.execute_sql('select count(*) from users;')
         assert res.fetchone()[0] == 2
 
     def test_transactions(self):
@@ -110,39 +137,35 @@ class TestTransaction(ModelTestCase):
         gen = transaction_generator()
         next(gen)
 
-        conn2 = self.new_connection()
-        res = conn2.execute_sql('select count(*) from users;').fetchone()
+        res = self.observer_db.execute_sql(
+            'select count(*) from users;').fetchone()
         assert res[0] == 0
 
-        assert User.select().count() == 1
+        assert_user_count(1)
 
-        # Consume the rest of the generator.
-        for _ in gen:
-            pass
+        # Resume the generator to create 'u2' and commit; it then finishes.
+        next(gen, None)
 
-        assert User.select().count() == 2
-        res = conn2.execute_sql('select count(*) from users;').fetchone()
+        assert_user_count(2)
+        res = self.observer_db.execute_sql(
+            'select count(*) from users;').fetchone()
         assert res[0] == 2
 
     def test_manual_commit_rollback(self):
-        def assertUsers(expected):
-            query = User.select(User.username).order_by(User.username)
-            assert [username for username, in query.tuples()] == expected
-
         with test_db.transaction() as txn:
             User.create(username='charlie')
             txn.commit()
             User.create(username='huey')
             txn.rollback()
 
-        assertUsers(['charlie'])
+        assert get_usernames() == ['charlie']
 
         with test_db.transaction() as txn:
             User.create(username='huey')
             txn.rollback()
             User.create(username='zaizee')
 
-        assertUsers(['charlie', 'zaizee'])
+        assert get_usernames() == ['charlie', 'zaizee']
 
     def test_transaction_decorator(self):
         @test_db.transaction()
@@ -219,11 +242,11 @@ class TestTransaction(ModelTestCase):
 
         with pytest.raises(ValueError):
             outer(should_fail=True)
-        assert User.select().count() == 0
+        assert_user_count(0)
         assert test_db.transaction_depth() == 0
 
         outer(should_fail=False)
-        assert User.select().count() == 2
+        assert_user_count(2)
         assert test_db.transaction_depth() == 0
 
 
@@ -240,7 +263,6 @@ class TestExecutionContext(ModelTestCase):
             assert User.select().where(User.username == 'charlie').exists()
             assert test_db.execution_context_depth() == 1
         assert test_db.execution_context_depth() == 0
-        self.queries()
 
     def test_context_ext(self):
         with test_db.execution_context():
@@ -258,15 +280,20 @@ class TestExecutionContext(ModelTestCase):
 
     def test_context_multithreaded(self):
         conn = test_db.get_conn()
-        evt = threading.Event()
-        evt2 = threading.Event()
+        # state[0] is 1 once the thread has entered its context, and 2 once
+        # the main thread has checked its own depth.
+        cond = threading.Condition()
+        state = [0]
 
         def create():
             with test_db.execution_context() as ctx:
                 database = ctx.database
                 assert database.execution_context_depth() == 1
-                evt2.set()
-                evt.wait()
+                with cond:
+                    state[0] = 1
+                    cond.notify()
+                    while state[0] != 2:
+                        cond.wait()
                 assert conn != ctx.connection
                 User.create(username='huey')
 
@@ -274,9 +301,12 @@ class TestExecutionContext(ModelTestCase):
         create_t.daemon = True
         create_t.start()
 
-        evt2.wait()
-        assert test_db.execution_context_depth() == 0
-        evt.set()
+        with cond:
+            while state[0] != 1:
+                cond.wait()
+            assert test_db.execution_context_depth() == 0
+            state[0] = 2
+            cond.notify()
         create_t.join()
 
         assert test_db.execution_context_depth() == 0
@@ -293,10 +323,9 @@ class TestExecutionContext(ModelTestCase):
                    for i in range(5)]
         for thread in threads:
             thread.start()
-        [thread.join() for thread in threads]
-        assert [user.username for user in
-                User.select().order_by(User.username)] == ['u0', 'u1', 'u2',
-                                                           'u3', 'u4']
+        for thread in threads:
+            thread.join()
+        assert get_usernames() == ['u0', 'u1', 'u2', 'u3', 'u4']
 
     def test_context_conn_error(self):
         class MagicException(Exception):
@@ -406,17 +435,18 @@ class TestSavepoints(ModelTestCase):
                 raise ValueError('failing')
 
     def assertNames(self, expected):
-        query = User.select().order_by(User.username)
-        assert [u.username for u in query] == expected
+        assert get_usernames() == expected
 
     def test_success(self):
-        with test_db.transaction():
-            self._outer()
-            assert User.select().count() == 2
+        with self.log_queries() as query_logger:
+            with test_db.transaction('IMMEDIATE'):
+                self._outer()
+                assert User.select().count() == 2
         self.assertNames(['inner', 'outer'])
+        assert query_logger.queries[0] == ('BEGIN IMMEDIATE', None)
 
     def test_inner_failure(self):
-        with test_db.transaction():
+        with test_db.transaction('IMMEDIATE'):
             self._outer(fail_inner=True)
             assert User.select().count() == 1
         self.assertNames(['outer'])
@@ -424,13 +454,13 @@ class TestSavepoints(ModelTestCase):
     def test_outer_failure(self):
         # Because the outer savepoint is rolled back, we'll lose the
         # inner savepoint as well.
-        with test_db.transaction():
+        with test_db.transaction('IMMEDIATE'):
             with pytest.raises(ValueError):
                 self._outer(fail_outer=True)
             assert User.select().count() == 0
 
     def test_failure(self):
-        with test_db.transaction():
+        with test_db.transaction('IMMEDIATE'):
             with pytest.raises(ValueError):
                 self._outer(fail_outer=True, fail_inner=True)
             assert User.select().count() == 0
@@ -439,6 +469,15 @@ class TestSavepoints(ModelTestCase):
 class TestAtomic(ModelTestCase):
     requires = [User, UniqueModel]
 
+    def setUp(self):
+        super(TestAtomic, self).setUp()
+        self.observer_db = self.new_connection()
+
+    def tearDown(self):
+        if not self.observer_db.is_closed():
+            self.observer_db.close()
+        super(TestAtomic, self).tearDown()
+
     def test_atomic(self):
         with test_db.atomic():
             User.create(username='u1')
@@ -457,16 +496,14 @@ class TestAtomic(ModelTestCase):
 
             User.create(username='u6')
 
-        query = User.select().order_by(User.username)
-        assert [u.username for u in query] == ['u1', 'u2', 'u4', 'u6']
+        assert get_usernames() == ['u1', 'u2', 'u4', 'u6']
 
     def test_atomic_second_connection(self):
         def test_separate_conn(expected):
-            new_db = self.new_connection()
-            cursor = new_db.execute_sql('select username from users;')
-            usernames = sorted(row[0] for row in cursor.fetchall())
+            cursor = self.observer_db.execute_sql(
+                'select username from users order by username;')
+            usernames = [row[0] for row in cursor.fetchall()]
             assert usernames == expected
-            new_db.close()
 
         with test_db.atomic():
             User.create(username='u1')
@@ -481,11 +518,9 @@ class TestAtomic(ModelTestCase):
 
             test_separate_conn([])
 
-            users = User.select(User.username).order_by(User.username)
-            assert [user.username for user in users] == ['u1', 'u2']
+            assert get_usernames() == ['u1', 'u2']
 
-        users = User.select(User.username).order_by(User.username)
-        assert [user.username for user in users] == ['u1', 'u2']
+        assert get_usernames() == ['u1', 'u2']
 
     def test_atomic_decorator(self):
         @test_db.atomic()
@@ -512,11 +547,11 @@ class TestAtomic(ModelTestCase):
         assert UniqueModel.select().count() == 1
 
         create_both('charlie')
-        assert User.select().count() == 1
+        assert_user_count(1)
         assert UniqueModel.select().count() == 2
 
         create_both('huey')
-        assert User.select().count() == 2
+        assert_user_count(2)
         assert UniqueModel.select().count() == 2
 
     def test_atomic_rollback(self):
@@ -543,19 +578,16 @@ class TestAtomic(ModelTestCase):
                 UniqueModel.create(name='mickey')
             UniqueModel.create(name='huey')
 
-        names = [um.name for um in
-                 UniqueModel.select().order_by(UniqueModel.name)]
+        names = [name for name, in unique_names_query.clone()]
         assert names == ['charlie', 'huey', 'mickey', 'zaizee']
 
     def test_atomic_with_delete(self):
-        for i in range(3):
-            User.create(username='u{0!s}'.format(i))
+        User.bulk_create_users(['u0', 'u1', 'u2'])
 
         with test_db.atomic():
             User.get(User.username == 'u1').delete_instance()
 
-        usernames = [u.username for u in User.select()]
-        assert sorted(usernames) == ['u0', 'u2']
+        assert get_usernames() == ['u0', 'u2']
 
         with test_db.atomic():
             with test_db.atomic():